@@ -1,9 +1,16 @@
 from dotenv import load_dotenv
 import logging
 import asyncio
+import contextvars
 import os
 import re
-from typing import List, Dict
+import time
+import httpx
+import orjson
+import xxhash
+from collections import deque
+from cachetools import TTLCache
+from typing import Dict, Iterable, List
 
 from livekit import agents
 from livekit.agents import (
@@ -17,13 +24,20 @@ from livekit.agents import (
 from livekit.plugins import noise_cancellation
 from livekit.plugins import google
 
-from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
-from tools import get_weather, search_web, send_email, get_local_time
+from prompts import AGENT_INSTRUCTION, get_session_instruction
+from tools import get_weather, search_web, send_email, get_local_time, get_greeting, close_email, close_http
 from mem0 import AsyncMemoryClient
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
+# uvloop (libuv-backed) cuts per-await/callback overhead; not available on Windows.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:  # pragma: no cover
+    pass
+
 USER_ID = os.getenv("USER_ID", "Bruce Wayne").strip()
 
 # -------------------------
@@ -38,12 +52,57 @@ RECENT_MEMORY_LIMIT = int(os.getenv("RECENT_MEMORY_LIMIT", "60"))
 # How many "SESSION SUMMARY" memories to preload (high-signal history)
 SESSION_SUMMARY_LIMIT = int(os.getenv("SESSION_SUMMARY_LIMIT", "10"))
 
+# Approximate token budget for preloaded memories in the agent prompt (~4 chars/token)
+MEMORY_CONTEXT_TOKEN_BUDGET = int(os.getenv("MEMORY_CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Upper bound (seconds) for each mem0 call made while saving on shutdown
+MEMORY_SAVE_TIMEOUT = float(os.getenv("MEMORY_SAVE_TIMEOUT", "5"))
+
+# How long (seconds) a recall_memory answer is reused for an equivalent query
+RECALL_CACHE_TTL = float(os.getenv("RECALL_CACHE_TTL", "300"))
+
+
+# -------------------------
+# STRICT RULES
+# -------------------------
+STRICT_RULES = """
+# RULES (CRITICAL)
+- Say "Mr. Wayne" in every reply.
+- Date/time -> get_local_time. Weather -> get_weather (ask city if missing). Email -> send_email. Never guess or fake.
+- Personal questions (name, favorites, preferences, email): call recall_memory first and answer ONLY from it;
+  if it returns "No relevant memory found.", ask ONE short follow-up question.
+"""
+
+# Static parts of the agent instructions, built once at import
+_PROMPT_PREFIX = AGENT_INSTRUCTION
+_PROMPT_SUFFIX = "\n" + STRICT_RULES
+
 
 # -------------------------
 # Noise filtering helpers
 # -------------------------
+# common greeting/small-talk/bye patterns (user + assistant)
+_SMALL_TALK_PATTERNS = [
+    r"\bhi\b", r"\bhello\b", r"\bhey\b",
+    r"how are you", r"how you doing", r"what's up", r"wassup",
+    r"good morning", r"good afternoon", r"good evening", r"good night",
+    r"\bbye\b", r"bye bye", r"see you", r"take care", r"goodbye",
+    r"thank you", r"thanks", r"thx", r"ok\b", r"okay\b", r"alright\b",
+    r"nice", r"cool", r"great", r"perfect", r"fine",
+]
+# One alternation = one scan per message instead of one per pattern
+_SMALL_TALK_RE = re.compile("|".join(_SMALL_TALK_PATTERNS))
+_TRAIL_PUNCT_RE = re.compile(r"[^\w\s]+$")
+
+# assistant acknowledgement openers: single words, plus two-word phrases
+# keyed by their first word ("got it", "of course", "will do")
+_ACK_WORDS = frozenset({"sure", "okay", "alright", "done", "check", "noted"})
+_ACK_PHRASES = {"got": "it", "of": "course", "will": "do"}
+
+
 def _normalize_text(text: str) -> str:
-    return re.sub(r"\s+", " ", (text or "").strip())
+    # split() with no args collapses all whitespace runs and trims both ends, in C
+    return " ".join((text or "").split())
 
 
 def _is_noise(text: str, role: str) -> bool:
@@ -55,24 +114,18 @@ def _is_noise(text: str, role: str) -> bool:
     if len(t) < 12:
         return True
 
-    # common greeting/small-talk/bye patterns (user + assistant)
-    small_talk_patterns = [
-        r"\bhi\b", r"\bhello\b", r"\bhey\b",
-        r"how are you", r"how you doing", r"what's up", r"wassup",
-        r"good morning", r"good afternoon", r"good evening", r"good night",
-        r"\bbye\b", r"bye bye", r"see you", r"take care", r"goodbye",
-        r"thank you", r"thanks", r"thx", r"ok\b", r"okay\b", r"alright\b",
-        r"nice", r"cool", r"great", r"perfect", r"fine",
-    ]
-    for pat in small_talk_patterns:
-        if re.search(pat, t):
-            # if it's basically just small talk, treat as noise
-            if len(t) < 60:
-                return True
+    # if it's basically just small talk, treat as noise
+    if len(t) < 60 and _SMALL_TALK_RE.search(t):
+        return True
 
     # assistant acknowledgements are noise
     if role == "assistant":
-        if t.startswith(("sure", "okay", "alright", "done", "got it", "of course", "will do", "check", "noted")):
+        first, _, rest = t.partition(" ")
+        first = first.rstrip(".,;:!?")
+        if first in _ACK_WORDS:
+            return True
+        second = _ACK_PHRASES.get(first)
+        if second and rest.startswith(second):
             return True
 
     return False
@@ -90,36 +143,129 @@ def _looks_like_tool_dump(text: str) -> bool:
     return False
 
 
-def _make_session_summary(filtered_msgs: List[Dict[str, str]]) -> str:
+def _make_session_summary(last_user: Iterable[str], last_asst: Iterable[str]) -> str:
     """
     Compact recap to keep long-term memory useful and scalable.
     Heuristic summary: last ~8 user messages + last ~4 assistant messages (trimmed).
+    Lines are expected to be normalized already.
     """
-    user_lines = [m["content"] for m in filtered_msgs if m["role"] == "user"]
-    asst_lines = [m["content"] for m in filtered_msgs if m["role"] == "assistant"]
-
-    last_user = user_lines[-8:]
-    last_asst = asst_lines[-4:]
-
-    if not last_user and not last_asst:
-        return ""
-
     # Keep it compact
     parts = []
     if last_user:
-        parts.append("User: " + " | ".join(_normalize_text(x) for x in last_user))
+        parts.append("User: " + " | ".join(last_user))
     if last_asst:
-        parts.append("Assistant: " + " | ".join(_normalize_text(x) for x in last_asst))
+        parts.append("Assistant: " + " | ".join(last_asst))
+
+    if not parts:
+        return ""
 
     summary = "SESSION SUMMARY: " + " || ".join(parts)
     return summary[:900]  # hard cap to avoid bloating memory
 
+# "my name is ...", "my email is ...", "my favourite colour is ..."
+# A value ends at a clause boundary or a joining word ("... and my email is ...").
+_KV_FACT_RE = re.compile(
+    r"\bmy (name|email|favou?rite \w+) is "
+    r"([\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+    r"|(?:(?!\s+(?:and|but|or|so|because|though|although|which|who|if|when|since)\b)[^.!?,;])+)",
+    re.IGNORECASE,
+)
+
+# Hedged or negated values ("my name is not important") aren't facts
+_KV_SKIP_WORDS = frozenset(
+    "not no never none nothing um uh like just kind sort probably maybe actually basically".split()
+)
+
+
+def _extract_kv_facts(text: str, facts: Dict[str, str]) -> None:
+    """
+    Cheap local extraction of explicit user facts. Later statements win.
+    """
+    for key, value in _KV_FACT_RE.findall(text):
+        value = value.strip().rstrip(".")
+        if value and value.split(None, 1)[0].lower() not in _KV_SKIP_WORDS:
+            key = key.lower().replace("favourite", "favorite")
+            facts[key] = f"User's {key} is {value}"
+
+
 def _fingerprint(text: str) -> str:
     # Normalize hard for dedupe
     t = _normalize_text(text).lower()
     # remove trailing punctuation noise
-    t = re.sub(r"[^\w\s]+$", "", t)
-    return t
+    t = _TRAIL_PUNCT_RE.sub("", t)
+    # fixed-size 64-bit digest: cheap to store in sets and to compare
+    return xxhash.xxh3_64_hexdigest(t)
+
+
+# -------------------------
+# recall_memory cache
+# -------------------------
+_RECALL_CACHE_MAX = 1024
+_recall_cache: dict[str, tuple[float, str]] = {}
+
+
+def _recall_cache_key(query: str) -> str:
+    """
+    Order/repetition-insensitive key, so "full name name" and "name full name" share an entry.
+    """
+    words = sorted(set(_normalize_text(query).lower().split()))
+    return USER_ID + "\x00" + " ".join(words)
+
+
+def _recall_cache_get(key: str) -> str | None:
+    hit = _recall_cache.get(key)
+    if hit is None:
+        return None
+    expires_at, value = hit
+    if expires_at < time.monotonic():
+        del _recall_cache[key]
+        return None
+    return value
+
+
+def _recall_cache_put(key: str, value: str) -> None:
+    if len(_recall_cache) >= _RECALL_CACHE_MAX:
+        # dicts keep insertion order -> drop the oldest entry
+        del _recall_cache[next(iter(_recall_cache))]
+    _recall_cache[key] = (time.monotonic() + RECALL_CACHE_TTL, value)
+
+
+def _trim_to_token_budget(lines: List[str], budget: int) -> List[str]:
+    """
+    Keep lines in order until the approximate token budget is spent; drop the rest.
+    Callers put the highest-signal lines (session summaries) first.
+    """
+    used = 0
+    for i, line in enumerate(lines):
+        used += len(line) // 4 + 1
+        if used > budget:
+            return lines[:i]
+    return lines
+
+
+# -------------------------
+# mem0 search cache (quick reconnects)
+# -------------------------
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=256, ttl=30)
+_search_locks: dict[tuple[str, str, int], asyncio.Lock] = {}
+
+
+async def _cached_search(mem_client, user_id: str, query: str, limit: int) -> dict:
+    """
+    mem0 search behind a short TTL cache keyed by (user_id, query, limit).
+    Concurrent identical lookups wait on one request instead of each hitting mem0.
+    """
+    key = (user_id, query, limit)
+    resp = _SEARCH_CACHE.get(key)
+    if resp is not None:
+        return resp
+
+    async with _search_locks.setdefault(key, asyncio.Lock()):
+        resp = _SEARCH_CACHE.get(key)
+        if resp is None:
+            resp = await mem_client.search(query=query, filters={"user_id": user_id}, limit=limit)
+            _SEARCH_CACHE[key] = resp
+    return resp
 
 
 async def _load_recent_memory_fingerprints(mem_client, user_id: str, limit: int = 250) -> set[str]:
@@ -148,11 +294,7 @@ async def _get_latest_session_summary(mem_client, user_id: str) -> str:
     Fetch the latest SESSION SUMMARY (if any) to avoid storing the same summary repeatedly.
     """
     try:
-        resp = await mem_client.search(
-            query="SESSION SUMMARY:",
-            filters={"user_id": user_id},
-            limit=1,
-        )
+        resp = await _cached_search(mem_client, user_id, "SESSION SUMMARY:", 1)
         results = resp.get("results", []) or []
         if results:
             return (results[0].get("memory") or "").strip()
@@ -160,77 +302,140 @@ async def _get_latest_session_summary(mem_client, user_id: str) -> str:
         logging.error(f"❌ Failed to fetch latest session summary: {e}")
     return ""
 
+
+# -------------------------
+# MEMORY RECALL TOOL (LIVE)
+# -------------------------
+# Defined once at import; entrypoint sets the job's client in this context var.
+# Not a module global: with the thread executor several jobs (each on its own
+# event loop) share the process, and a client's connection pool is loop-bound.
+# Tool calls run in tasks spawned from the job, so they inherit the value.
+_MEM_CLIENT: contextvars.ContextVar[AsyncMemoryClient | None] = contextvars.ContextVar(
+    "mem_client", default=None
+)
+
+# Fingerprint of the last summary this worker saved (or confirmed already stored)
+_LAST_SAVED_FP: str | None = None
+
+
+@function_tool()
+async def recall_memory(context: RunContext, query: str) -> str:  # type: ignore
+    """
+    Search mem0 for user-specific facts. Use for personal questions like name, favorites, preferences, etc.
+    """
+    key = _recall_cache_key(query)
+    cached = _recall_cache_get(key)
+    if cached is not None:
+        return cached
+
+    mem_client = _MEM_CLIENT.get()
+    if mem_client is None:
+        return "Memory lookup failed."
+
+    try:
+        resp = await mem_client.search(
+            query=query,
+            filters={"user_id": USER_ID},
+            limit=MEMORY_RECALL_LIMIT,
+        )
+        results = resp.get("results", []) or []
+        facts = [r.get("memory", "").strip() for r in results if r.get("memory")]
+        if not facts:
+            answer = "No relevant memory found."
+        else:
+            answer = "Relevant memories:\n" + "\n".join(f"- {f}" for f in facts)
+        _recall_cache_put(key, answer)
+        return answer
+    except Exception as e:
+        logging.error(f"❌ recall_memory failed: {e}")
+        return "Memory lookup failed."
+
+
+class _OrjsonAsyncClient(httpx.AsyncClient):
+    """
+    httpx client that encodes `json=` request bodies with orjson instead of stdlib json.
+    """
+
+    def build_request(self, method, url, *, content=None, json=None, **kwargs):  # type: ignore[override]
+        if json is not None and content is None:
+            content = orjson.dumps(json)
+            json = None
+            headers = httpx.Headers(kwargs.pop("headers", None))
+            headers.setdefault("Content-Type", "application/json")
+            kwargs["headers"] = headers
+        return super().build_request(method, url, content=content, json=json, **kwargs)
+
+
+def _make_mem_client() -> AsyncMemoryClient:
+    try:
+        # mem0 sets base_url/auth headers on a client passed in
+        return AsyncMemoryClient(client=_OrjsonAsyncClient(timeout=300))
+    except TypeError:
+        # older mem0 releases don't accept a custom httpx client
+        return AsyncMemoryClient()
+
+
 async def entrypoint(ctx: agents.JobContext):
-    mem_client = AsyncMemoryClient()
+    # Python 3.12+: coroutines that finish without suspending never hit the ready queue
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
 
-    # -------------------------
-    # MEMORY RECALL TOOL (LIVE)
-    # -------------------------
-    @function_tool()
-    async def recall_memory(context: RunContext, query: str) -> str:  # type: ignore
-        """
-        Search mem0 for user-specific facts. Use for personal questions like name, favorites, preferences, etc.
-        """
-        try:
-            resp = await mem_client.search(
-                query=query,
-                filters={"user_id": USER_ID},
-                limit=MEMORY_RECALL_LIMIT,
-            )
-            results = resp.get("results", []) or []
-            facts = [r.get("memory", "").strip() for r in results if r.get("memory")]
-            if not facts:
-                return "No relevant memory found."
-            return "Relevant memories:\n" + "\n".join(f"- {f}" for f in facts)
-        except Exception as e:
-            logging.error(f"❌ recall_memory failed: {e}")
-            return "Memory lookup failed."
+    mem_client = _make_mem_client()
+    _MEM_CLIENT.set(mem_client)
 
     # -------------------------
     # STARTUP: PRELOAD HIGH-SIGNAL MEMORY
     # -------------------------
+    # Dedupe while accumulating (keyed on fingerprint so case/whitespace
+    # variants of the same memory collapse too), preserving order
+    seen: set[str] = set()
     known_facts_lines: list[str] = []
 
-    # (A) Load recent "SESSION SUMMARY" memories (cleanest signal)
-    try:
-        resp_sum = await mem_client.search(
-            query="SESSION SUMMARY:",
-            filters={"user_id": USER_ID},
-            limit=SESSION_SUMMARY_LIMIT,
-        )
+    # (A) recent "SESSION SUMMARY" memories (cleanest signal) and
+    # (B) recent general memories (still useful, but can be noisy)
+    # are independent lookups, so fetch them concurrently.
+    resp_sum, resp_recent = await asyncio.gather(
+        _cached_search(mem_client, USER_ID, "SESSION SUMMARY:", SESSION_SUMMARY_LIMIT),
+        _cached_search(
+            mem_client,
+            USER_ID,
+            "recent conversation important facts preferences ongoing tasks decisions",
+            RECENT_MEMORY_LIMIT,
+        ),
+        return_exceptions=True,
+    )
+
+    if isinstance(resp_sum, Exception):
+        logging.error(f"❌ Session summary preload failed: {resp_sum}")
+    else:
         sum_results = resp_sum.get("results", []) or []
         for r in sum_results:
             m = (r.get("memory") or "").strip()
             if m:
-                known_facts_lines.append(f"- {m}")
+                fp = _fingerprint(m)
+                if fp not in seen:
+                    seen.add(fp)
+                    known_facts_lines.append(f"- {m}")
         logging.info(f"✅ Loaded {len(sum_results)} session summaries for startup context")
-    except Exception as e:
-        logging.error(f"❌ Session summary preload failed: {e}")
 
-    # (B) Load recent general memories (still useful, but can be noisy)
-    try:
-        resp_recent = await mem_client.search(
-            query="recent conversation important facts preferences ongoing tasks decisions",
-            filters={"user_id": USER_ID},
-            limit=RECENT_MEMORY_LIMIT,
-        )
+    if isinstance(resp_recent, Exception):
+        logging.error(f"❌ Recent memory preload failed: {resp_recent}")
+    else:
         recent_results = resp_recent.get("results", []) or []
         for r in recent_results:
             m = (r.get("memory") or "").strip()
             if m:
-                known_facts_lines.append(f"- {m}")
+                fp = _fingerprint(m)
+                if fp not in seen:
+                    seen.add(fp)
+                    known_facts_lines.append(f"- {m}")
         logging.info(f"✅ Loaded {len(recent_results)} recent memories for startup context")
-    except Exception as e:
-        logging.error(f"❌ Recent memory preload failed: {e}")
 
-    # Deduplicate while preserving order
-    seen = set()
-    deduped = []
-    for line in known_facts_lines:
-        if line not in seen:
-            seen.add(line)
-            deduped.append(line)
-    known_facts_lines = deduped
+    # Every line here is prefilled on every LLM turn, so cap it
+    kept = _trim_to_token_budget(known_facts_lines, MEMORY_CONTEXT_TOKEN_BUDGET)
+    if len(kept) < len(known_facts_lines):
+        logging.info(f"ℹ️ Dropped {len(known_facts_lines) - len(kept)} memories over the prompt token budget")
+    known_facts_lines = kept
 
     # IMPORTANT: Match your prompts.py expectation exactly:
     # "KNOWN FACTS ABOUT MR. WAYNE"
@@ -238,25 +443,8 @@ async def entrypoint(ctx: agents.JobContext):
     if known_facts_lines:
         memory_block = "\n\n# KNOWN FACTS ABOUT MR. WAYNE\n" + "\n".join(known_facts_lines) + "\n"
 
-    # -------------------------
-    # STRICT RULES
-    # -------------------------
-    strict_rules = f"""
-# ABSOLUTE RULES (CRITICAL)
-- Always include "Mr. Wayne" in every response (at least once).
-- If asked date/time: ALWAYS call get_local_time. Never guess.
-- If asked weather: ALWAYS call get_weather (ask city if missing).
-- If asked to send email: ALWAYS call send_email. Never fake it.
-
-# MEMORY USAGE (CRITICAL)
-- You have a tool called recall_memory(query).
-- For ANY personal question (name/full name, favorites, preferences, likes/dislikes, email):
-  1) FIRST call recall_memory with the relevant query.
-  2) Answer ONLY using the returned memories.
-  3) If recall_memory returns "No relevant memory found.", ask ONE short follow-up question.
-"""
-
-    combined_instructions = AGENT_INSTRUCTION + memory_block + "\n" + strict_rules
+    # Only the memory block varies per session
+    combined_instructions = "".join((_PROMPT_PREFIX, memory_block, _PROMPT_SUFFIX))
 
     # -------------------------
     # CREATE SESSION + AGENT
@@ -266,13 +454,14 @@ async def entrypoint(ctx: agents.JobContext):
         instructions=combined_instructions,
         llm=google.beta.realtime.RealtimeModel(
             voice="aoede",
-            temperature=1.2,
+            temperature=0.8,
         ),
         tools=[
             get_weather,
             search_web,
             send_email,
             get_local_time,
+            get_greeting,
             recall_memory,
         ],
         chat_ctx=ChatContext(),
@@ -288,15 +477,25 @@ async def entrypoint(ctx: agents.JobContext):
     )
 
     await ctx.connect()
-    await session.generate_reply(instructions=SESSION_INSTRUCTION)
+    await session.generate_reply(instructions=get_session_instruction())
 
     # -------------------------
     # SAVE CHAT ON EXIT (SMART + LOW NOISE)
     # -------------------------
     async def save_full_chat():
+        global _LAST_SAVED_FP
         logging.info("💾 Saving high-signal memory only")
 
-        raw_messages = []
+        # Fetch the latest stored summary while we walk the chat and build the new one
+        latest_task = asyncio.create_task(_get_latest_session_summary(mem_client, USER_ID))
+
+        # Memories may change once this session is saved
+        _recall_cache.clear()
+
+        # Single pass: only the tail of each role feeds the summary
+        last_user: deque[str] = deque(maxlen=8)
+        last_asst: deque[str] = deque(maxlen=4)
+        kv_facts: Dict[str, str] = {}
 
         for item in agent.chat_ctx.items:
             role = getattr(item, "role", None)
@@ -305,42 +504,73 @@ async def entrypoint(ctx: agents.JobContext):
             if role not in ["user", "assistant", "model"]:
                 continue
 
-            normalized_role = "assistant" if role == "model" else role
-            text = "".join(content) if isinstance(content, list) else str(content)
+            # exact-type checks: the common str case skips the join/str() copy
+            if type(content) is str:
+                text = content
+            elif type(content) is list:
+                text = "".join(content)
+            else:
+                text = str(content)
             text = _normalize_text(text)
 
             if not text:
                 continue
 
-            raw_messages.append({"role": normalized_role, "content": text})
+            if role == "user":
+                last_user.append(text)
+                _extract_kv_facts(text, kv_facts)
+            else:
+                last_asst.append(text)
 
-        if not raw_messages:
+        if not last_user and not last_asst:
+            latest_task.cancel()
             return
 
         # Create compact session summary
-        summary = _make_session_summary(raw_messages)
+        summary = _make_session_summary(last_user, last_asst)
 
-        if not summary:
+        # Same summary as this worker's last save -> skip the mem0 round-trip entirely
+        fp = _fingerprint(summary)
+        if fp == _LAST_SAVED_FP:
+            latest_task.cancel()
+            logging.info("ℹ️ Session summary unchanged (local). Skipping save.")
             return
 
-        # Check if this summary already exists
-        latest_summary = await _get_latest_session_summary(mem_client, USER_ID)
+        # Check if this summary already exists (bounded: shutdown must not hang on mem0)
+        try:
+            latest_summary = await asyncio.wait_for(latest_task, timeout=MEMORY_SAVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.error("❌ Timed out fetching latest session summary")
+            latest_summary = ""
 
-        if _fingerprint(summary) == _fingerprint(latest_summary):
+        if fp == _fingerprint(latest_summary):
+            _LAST_SAVED_FP = fp
             logging.info("ℹ️ Session summary unchanged. Skipping save.")
             return
 
+        # Extracted facts ride along with the summary so mem0 inference dedupes and
+        # merges them with what's already stored instead of adding verbatim copies
+        messages = [{"role": "user", "content": summary}]
+        messages.extend({"role": "user", "content": fact} for fact in kv_facts.values())
+
         try:
-            await mem_client.add(
-                [{"role": "user", "content": summary}],
-                user_id=USER_ID,
-                infer=True,   # Only infer from summary
+            await asyncio.wait_for(
+                mem_client.add(messages, user_id=USER_ID, infer=True),
+                timeout=MEMORY_SAVE_TIMEOUT,
             )
-            logging.info("✅ Saved SESSION SUMMARY only")
+            _LAST_SAVED_FP = fp
+            # Cached searches no longer reflect stored memory
+            _SEARCH_CACHE.clear()
+            logging.info(f"✅ Saved SESSION SUMMARY + {len(kv_facts)} extracted facts")
+        except asyncio.TimeoutError:
+            logging.error(f"❌ Saving summary timed out after {MEMORY_SAVE_TIMEOUT}s")
         except Exception as e:
             logging.error(f"❌ Failed saving summary: {e}")
 
-    ctx.add_shutdown_callback(lambda: asyncio.create_task(save_full_chat()))
+    # Registered as a coroutine so the job awaits it instead of leaking a task
+    ctx.add_shutdown_callback(save_full_chat)
+    ctx.add_shutdown_callback(close_email)
+    ctx.add_shutdown_callback(close_http)
 
 
 if __name__ == "__main__":
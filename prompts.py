@@ -1,4 +1,7 @@
 import random
+import sys
+from functools import lru_cache
+from typing import Final
 
 # -------------------------
 # Personal Configuration (LOCAL ONLY)
@@ -40,17 +43,35 @@ GOODBYE_VARIATIONS = [
     f"Goodnight, {USER_NAME}. Try not to break anything important.",
 ]
 
+# Label per hour 0..23: night <5, morning 5-11, afternoon 12-16, evening 17-21, night 22+
+_TOD = ("night",) * 5 + ("morning",) * 7 + ("afternoon",) * 5 + ("evening",) * 5 + ("night",) * 2
+assert len(_TOD) == 24
+
+# Same table packed as 2-bit codes (index into _LABELS) in one 48-bit int: hour h at bits 2h..2h+1
+_LABELS = ("night", "morning", "afternoon", "evening")
+_PACKED = 0
+for _h, _label in enumerate(_TOD):
+    _PACKED |= _LABELS.index(_label) << (_h * 2)
+del _h, _label
+
+
 def time_of_day_label(hour: int) -> str:
-    if 5 <= hour < 12:
-        return "morning"
-    if 12 <= hour < 17:
-        return "afternoon"
-    if 17 <= hour < 22:
-        return "evening"
-    return "night"
+    return _LABELS[(_PACKED >> (((hour or 0) % 24) * 2)) & 3]
+
+
+# Greetings fully rendered per time of day at import, so picking one is just random.choice
+RENDERED_GREETINGS = {
+    tod: [g.format(time_of_day=tod) for g in GREETING_VARIATIONS]
+    for tod in ("morning", "afternoon", "evening", "night")
+}
+
+
+def pick_greeting(hour: int) -> str:
+    return random.choice(RENDERED_GREETINGS[time_of_day_label(hour)])
 
 
-AGENT_INSTRUCTION = f"""
+# Static prompt blobs: built once at import, interned so identical prompts are one object
+AGENT_INSTRUCTION: Final[str] = sys.intern(f"""
 # Persona
 You are a personal assistant called Oracle, inspired by a classy butler (Iron Man vibe).
 
@@ -91,10 +112,11 @@ CRITICAL RULE:
 - If the user asks about weather, temperature, rain, climate, or forecast, you MUST call the get_weather tool.
 - If the user does not specify a city, use the default city (DEFAULT_CITY).
 - After tool result, reply in 1 short sentence and include "{USER_NAME}".
-"""
+""")
 
-PROFILE_FACTS_TEXT = "\n- ".join(PERSONAL_PROFILE_FACTS)
-SESSION_INSTRUCTION = f"""
+PROFILE_FACTS_TEXT: Final[str] = "\n- ".join(PERSONAL_PROFILE_FACTS)
+
+_SESSION_INSTRUCTION_CACHED: Final[str] = sys.intern(f"""
 # Task
 - Provide assistance using tools when needed.
 - Start with a greeting (varied).
@@ -114,9 +136,33 @@ SESSION_INSTRUCTION = f"""
 - If present, answer confidently using them.
 - If not present, ask ONE short question to learn it, then continue.
 
-# Suggested Greeting Pool (use any, vary them)
-- {", ".join(GREETING_VARIATIONS)}
+# Greeting / Farewell
+- Call get_greeting for a varied opening line; call get_greeting with kind="farewell" when signing off.
+""")
+
+SESSION_INSTRUCTION: Final[str] = _SESSION_INSTRUCTION_CACHED
+
+
+@lru_cache(maxsize=1)
+def get_session_instruction() -> str:
+    """
+    The per-session greeting instruction. Built once at import; every session gets the same object.
+    """
+    return _SESSION_INSTRUCTION_CACHED
 
-# Suggested Farewell Pool (use any, vary them)
-- {", ".join(GOODBYE_VARIATIONS)}
-"""
\ No newline at end of file
+
+# UTF-8 encodings of the static prompts, for transports that take raw bytes
+AGENT_INSTRUCTION_BYTES: Final[bytes] = AGENT_INSTRUCTION.encode("utf-8")
+SESSION_INSTRUCTION_BYTES: Final[bytes] = SESSION_INSTRUCTION.encode("utf-8")
+
+# Static system prompt as cacheable blocks (Anthropic `system=` format). Content and
+# order must stay stable so provider-side prefix caches keep hitting across turns;
+# OpenAI caches the same leading prefix automatically.
+SYSTEM_BLOCKS: Final[list[dict]] = [
+    {"type": "text", "text": AGENT_INSTRUCTION, "cache_control": {"type": "ephemeral"}},
+    {
+        "type": "text",
+        "text": f"# PERSONAL PROFILE FACTS ABOUT {USER_NAME}\n- {PROFILE_FACTS_TEXT}",
+        "cache_control": {"type": "ephemeral"},
+    },
+]
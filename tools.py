@@ -1,15 +1,25 @@
+import asyncio
 import logging
 import os
-import requests
-import smtplib
+import random
+import sys
+import weakref
 
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+import httpx
+import orjson
+from cachetools import LRUCache, TTLCache
 
 from livekit.agents import function_tool, RunContext
-from langchain_community.tools import DuckDuckGoSearchRun
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+
+from prompts import GOODBYE_VARIATIONS, pick_greeting
+
+# Search and email dependencies are imported on first use, not at startup.
+if TYPE_CHECKING:  # pragma: no cover
+    import aiosmtplib
+    from langchain_community.tools import DuckDuckGoSearchRun
 
 # Try ZoneInfo; if tzdata missing on Windows, we fallback to fixed IST offset.
 try:
@@ -19,47 +29,117 @@ except Exception:  # pragma: no cover
     ZoneInfoNotFoundError = Exception  # type: ignore
 
 
-DEFAULT_CITY = os.getenv("DEFAULT_CITY", "Chennai").strip()
+DEFAULT_CITY = sys.intern(os.getenv("DEFAULT_CITY", "Chennai").strip())
+
+# One async client per event loop for all weather calls: pooled keep-alive (HTTP/2
+# where offered) and connect retries, without blocking the agent's event loop.
+# Per loop, not per process: with the thread executor (Windows default) each job
+# runs its own loop, and a client's connection pool is bound to the loop it ran on.
+_ASYNC_HTTP: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+def _http() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_HTTP.get(loop)
+    if client is None or client.is_closed:
+        client = _ASYNC_HTTP[loop] = httpx.AsyncClient(
+            timeout=7,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            ),
+        )
+    return client
+
+async def close_http() -> None:
+    """
+    Job shutdown: close this loop's weather client and its pooled connections.
+    """
+    client = _ASYNC_HTTP.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+# Requests currently in progress, keyed by "<tool>:<normalized input>". Concurrent
+# callers with the same key share one upstream call instead of each making their own.
+_INFLIGHT: dict[str, asyncio.Future] = {}
+
+async def _single_flight(key: str, fetch: Callable[[], Awaitable[str]]) -> str:
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda t: _INFLIGHT.pop(key, None) if _INFLIGHT.get(key) is t else None)
+    # shield: one caller being cancelled must not cancel the shared fetch
+    return await asyncio.shield(task)
 
 
 # -------------------------
 # TIME TOOL (robust on Windows)
 # -------------------------
 
+# Resolve IST once at import; fall back to a fixed offset if tzdata is missing
+_IST_TZ = timezone(timedelta(hours=5, minutes=30))
+if ZoneInfo is not None:
+    try:
+        _IST_TZ = ZoneInfo("Asia/Kolkata")
+    except ZoneInfoNotFoundError:
+        pass
+
+_TIME_FMT = "Today is %A, %d %B %Y and the time is %I:%M %p."
+_LAST_TIME_KEY: Optional[datetime] = None
+_LAST_TIME_STR: Optional[str] = None
+
+
 @function_tool()
 async def get_local_time(context: RunContext) -> str:  # type: ignore
     """
     Get the current local date and time (IST).
     Works on Windows even if tzdata is missing.
     """
+    global _LAST_TIME_KEY, _LAST_TIME_STR
     try:
-        if ZoneInfo is not None:
-            try:
-                now = datetime.now(ZoneInfo("Asia/Kolkata"))
-            except ZoneInfoNotFoundError:
-                # Fallback if tzdata not installed
-                ist = timezone(timedelta(hours=5, minutes=30))
-                now = datetime.now(ist)
-        else:
-            ist = timezone(timedelta(hours=5, minutes=30))
-            now = datetime.now(ist)
-
-        return now.strftime("Today is %A, %d %B %Y and the time is %I:%M %p.")
+        # output only changes once a minute: reuse the last formatted string
+        key = datetime.now(_IST_TZ).replace(second=0, microsecond=0)
+        if key != _LAST_TIME_KEY or _LAST_TIME_STR is None:
+            _LAST_TIME_STR = key.strftime(_TIME_FMT)
+            _LAST_TIME_KEY = key
+        return _LAST_TIME_STR
     except Exception as e:
         logging.error(f"Error getting local time: {e}")
         return "I’m unable to determine the current time right now, Mr. Wayne."
 
 
 # -------------------------
-# WEATHER TOOL (wttr.in + Open-Meteo fallback + variants)
+# GREETING TOOL
+# -------------------------
+
+@function_tool()
+async def get_greeting(context: RunContext, kind: str = "greeting") -> str:  # type: ignore
+    """
+    Pick a varied opening line (kind="greeting") or sign-off line (kind="farewell").
+    """
+    if kind == "farewell":
+        return random.choice(GOODBYE_VARIATIONS)
+    return pick_greeting(datetime.now(_IST_TZ).hour)
+
+
+# -------------------------
+# WEATHER TOOL (wttr.in raced against Open-Meteo + variants)
 # -------------------------
 
+# Weather changes slowly: reuse reports for 10 min; remember outages for 1 min
+_WEATHER_CACHE: TTLCache = TTLCache(maxsize=256, ttl=600)
+_WEATHER_FAIL_CACHE: TTLCache = TTLCache(maxsize=256, ttl=60)
+# Geocoding results are stable, so they are only evicted by size
+_GEOCODE_CACHE: LRUCache = LRUCache(maxsize=512)
+
 def _clean_city(city: Optional[str]) -> str:
-    if not city or not str(city).strip():
-        return DEFAULT_CITY
-    return str(city).strip()
+    s = city.strip() if isinstance(city, str) else str(city or "").strip()
+    return s or DEFAULT_CITY
 
-def _wttr(city: str) -> Optional[str]:
+async def _wttr(city: str) -> Optional[str]:
     """
     Primary provider: wttr.in
     """
@@ -68,57 +148,73 @@ def _wttr(city: str) -> Optional[str]:
     fmt = "%l: %C | Temp %t (feels %f) | Hum %h | Wind %w"
     url = f"https://wttr.in/{city}"
 
-    for attempt, timeout in enumerate([5, 7], start=1):
-        try:
-            r = requests.get(url, params={"format": fmt}, headers=headers, timeout=timeout)
-            if r.status_code == 200:
-                text = (r.text or "").strip()
-                if text:
-                    return text
-                logging.warning(f"wttr.in empty response for {city}")
-                return None
-            logging.error(f"wttr.in status {r.status_code} for {city}")
-        except requests.Timeout:
-            logging.error(f"wttr.in timed out (attempt {attempt}) for {city}")
-        except Exception as e:
-            logging.error(f"wttr.in error (attempt {attempt}) for {city}: {e}")
+    # connect retries are handled by the client's transport
+    try:
+        r = await _http().get(url, params={"format": fmt}, headers=headers)
+        if r.status_code == 200:
+            text = (r.text or "").strip()
+            if text:
+                return text
+            logging.warning(f"wttr.in empty response for {city}")
+            return None
+        logging.error(f"wttr.in status {r.status_code} for {city}")
+    except httpx.TimeoutException:
+        logging.error(f"wttr.in timed out for {city}")
+    except Exception as e:
+        logging.error(f"wttr.in error for {city}: {e}")
     return None
 
-def _open_meteo(city_query: str) -> Optional[str]:
+async def _geocode(city_query: str) -> Optional[tuple[float, float, str, str]]:
+    """
+    Resolve a place name to (lat, lon, place, country) via Open-Meteo geocoding.
+    Coordinates never change, so successful lookups are cached for the process lifetime.
+    """
+    hit = _GEOCODE_CACHE.get(city_query)
+    if hit is not None:
+        return hit
+
+    geo = await _http().get(
+        "https://geocoding-api.open-meteo.com/v1/search",
+        params={"name": city_query, "count": 1, "language": "en", "format": "json"},
+    )
+    if geo.status_code != 200:
+        logging.error(f"Open-Meteo geocode status {geo.status_code} for {city_query}")
+        return None
+
+    gj = orjson.loads(geo.content)
+    results = gj.get("results") or []
+    if not results:
+        logging.warning(f"Open-Meteo: no geocode results for {city_query}")
+        return None
+
+    coords = (
+        results[0]["latitude"],
+        results[0]["longitude"],
+        results[0].get("name", city_query),
+        results[0].get("country", ""),
+    )
+    _GEOCODE_CACHE[city_query] = coords
+    return coords
+
+async def _open_meteo(city_query: str) -> Optional[str]:
     """
     Backup provider: Open-Meteo (no API key).
     """
     try:
-        geo = requests.get(
-            "https://geocoding-api.open-meteo.com/v1/search",
-            params={"name": city_query, "count": 1, "language": "en", "format": "json"},
-            timeout=7,
-        )
-        if geo.status_code != 200:
-            logging.error(f"Open-Meteo geocode status {geo.status_code} for {city_query}")
+        coords = await _geocode(city_query)
+        if coords is None:
             return None
+        lat, lon, place, country = coords
 
-        gj = geo.json()
-        results = gj.get("results") or []
-        if not results:
-            logging.warning(f"Open-Meteo: no geocode results for {city_query}")
-            return None
-
-        lat = results[0]["latitude"]
-        lon = results[0]["longitude"]
-        place = results[0].get("name", city_query)
-        country = results[0].get("country", "")
-
-        wx = requests.get(
+        wx = await _http().get(
             "https://api.open-meteo.com/v1/forecast",
             params={"latitude": lat, "longitude": lon, "current_weather": "true"},
-            timeout=7,
         )
         if wx.status_code != 200:
             logging.error(f"Open-Meteo weather status {wx.status_code} for {city_query}")
             return None
 
-        wj = wx.json()
+        wj = orjson.loads(wx.content)
         cur = wj.get("current_weather")
         if not cur:
             return None
@@ -130,61 +226,252 @@ def _open_meteo(city_query: str) -> Optional[str]:
         loc = f"{place}{', ' + country if country else ''}"
         return f"{loc}: Temp {temp}°C | Wind {wind} km/h | Updated {time_utc} (UTC)"
 
-    except requests.Timeout:
+    except httpx.TimeoutException:
         logging.error(f"Open-Meteo timed out for {city_query}")
         return None
     except Exception as e:
         logging.error(f"Open-Meteo error for {city_query}: {e}")
         return None
 
-@function_tool()
-async def get_weather(context: RunContext, city: Optional[str] = None) -> str:  # type: ignore
+async def _first_report(*coros: Awaitable[Optional[str]]) -> Optional[str]:
     """
-    Weather for a city.
-    - wttr.in first
-    - Open-Meteo fallback with multiple query variants
+    Run lookups concurrently; return the first usable report and cancel the rest.
     """
-    city = _clean_city(city)
-
-    # 1) Try wttr.in
-    wt = _wttr(city)
-    if wt:
-        return wt
+    pending = {asyncio.ensure_future(c) for c in coros}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                report = task.result()
+                if report:
+                    return report
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
 
-    # 2) Try Open-Meteo with variants
+async def _open_meteo_variants(city: str) -> Optional[str]:
+    """
+    Fallback spellings and nearby places, queried concurrently; the earliest
+    success in list order wins, not the fastest.
+    """
     variants = [
-        city,
         f"{city}, India",
         "Kanniyakumari, India",   # alt spelling
         "Kanyakumari, Tamil Nadu, India",
         "Nagercoil, India",       # nearby fallback
     ]
-    for q in variants:
-        om = _open_meteo(q)
-        if om:
-            return om
+    # started together, awaited in list order: return as soon as the best-ranked
+    # variant that will succeed has answered, without waiting on slower ones
+    tasks = [asyncio.ensure_future(_open_meteo(q)) for q in variants]
+    try:
+        for task in tasks:
+            try:
+                om = await task
+            except Exception:
+                continue
+            if om:
+                return om
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _fetch_weather(city: str) -> Optional[str]:
+    """
+    Race wttr.in against Open-Meteo for the city as given; only if both miss
+    fall back to the Open-Meteo variants.
+    """
+    report = await _first_report(_wttr(city), _open_meteo(city))
+    if report:
+        return report
+    return await _open_meteo_variants(city)
+
+async def _weather_report(city: str, key: str) -> str:
+    report = await _fetch_weather(city)
+    if report:
+        _WEATHER_CACHE[key] = report
+        return report
+
+    failed = f"Weather services are unreachable right now for {city}, Mr. Wayne. (Network/DNS issue likely.)"
+    _WEATHER_FAIL_CACHE[key] = failed
+    return failed
 
-    return f"Weather services are unreachable right now for {city}, Mr. Wayne. (Network/DNS issue likely.)"
+@function_tool()
+async def get_weather(context: RunContext, city: Optional[str] = None) -> str:  # type: ignore
+    """
+    Weather for a city.
+    - wttr.in and Open-Meteo raced concurrently for the city as given
+    - if both miss, Open-Meteo retried with alternate spellings / nearby places
+    """
+    city = _clean_city(city)
+
+    key = city.lower()
+    hit = _WEATHER_CACHE.get(key) or _WEATHER_FAIL_CACHE.get(key)
+    if hit:
+        return hit
+
+    return await _single_flight("weather:" + key, lambda: _weather_report(city, key))
 
 
 # -------------------------
 # WEB SEARCH TOOL
 # -------------------------
 
-@function_tool()
-async def search_web(context: RunContext, query: str) -> str:  # type: ignore
+# Built on the first search and reused; if construction fails, the next call retries it
+_DDG: Optional["DuckDuckGoSearchRun"] = None
+
+# Repeat queries within 5 min are served locally; failures are remembered for 30 s
+# so a rate-limited DuckDuckGo isn't hammered with retries.
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=512, ttl=300)
+_SEARCH_FAIL_CACHE: TTLCache = TTLCache(maxsize=512, ttl=30)
+
+async def _search(query: str, key: str) -> str:
+    global _DDG
     try:
-        results = DuckDuckGoSearchRun().run(tool_input=query)
+        if _DDG is None:
+            from langchain_community.tools import DuckDuckGoSearchRun
+            _DDG = DuckDuckGoSearchRun()
+        # DuckDuckGoSearchRun is blocking; keep it off the event loop
+        results = await asyncio.to_thread(_DDG.run, tool_input=query)
+        _SEARCH_CACHE[key] = results
         return results
     except Exception as e:
         logging.error(f"Search error: {e}")
-        return "An error occurred while searching the web, Mr. Wayne."
+        failed = "An error occurred while searching the web, Mr. Wayne."
+        _SEARCH_FAIL_CACHE[key] = failed
+        return failed
+
+@function_tool()
+async def search_web(context: RunContext, query: str) -> str:  # type: ignore
+    key = query.strip().lower()
+    hit = _SEARCH_CACHE.get(key) or _SEARCH_FAIL_CACHE.get(key)
+    if hit:
+        return hit
+
+    return await _single_flight("search:" + key, lambda: _search(query, key))
 
 
 # -------------------------
 # EMAIL TOOL
 # -------------------------
 
+# One long-lived aiosmtplib connection, reused across sends (TLS + AUTH paid once).
+# All SMTP I/O is non-blocking on the event loop; only the email worker below touches it.
+_SMTP_CONN: Optional["aiosmtplib.SMTP"] = None
+
+# Queued sends: (gmail_user, gmail_password, recipients, message, future)
+_EMAIL_BATCH_MAX = 10
+_EMAIL_QUEUE: Optional[asyncio.Queue] = None
+_EMAIL_WORKER: Optional[asyncio.Task] = None
+
+def _reset_smtp() -> None:
+    global _SMTP_CONN
+    if _SMTP_CONN is not None:
+        try:
+            _SMTP_CONN.close()
+        except Exception:
+            pass
+    _SMTP_CONN = None
+
+async def _get_smtp(gmail_user: str, gmail_password: str) -> "aiosmtplib.SMTP":
+    """
+    Return the pooled connection if it still answers NOOP, otherwise reconnect.
+    """
+    import aiosmtplib
+
+    global _SMTP_CONN
+    if _SMTP_CONN is not None:
+        try:
+            if _SMTP_CONN.is_connected and (await _SMTP_CONN.noop()).code == 250:
+                return _SMTP_CONN
+        except aiosmtplib.SMTPException:
+            pass
+        _reset_smtp()
+
+    conn = aiosmtplib.SMTP(hostname="smtp.gmail.com", port=587, start_tls=True, timeout=20)
+    await conn.connect()
+    try:
+        await conn.login(gmail_user, gmail_password)
+    except Exception:
+        conn.close()
+        raise
+    _SMTP_CONN = conn
+    return conn
+
+async def _sendmail(gmail_user: str, gmail_password: str, recipients: list[str], msg: bytes) -> None:
+    import aiosmtplib
+
+    try:
+        await (await _get_smtp(gmail_user, gmail_password)).sendmail(gmail_user, recipients, msg)
+    except aiosmtplib.SMTPServerDisconnected:
+        # server dropped the pooled connection between NOOP and send: reconnect once
+        _reset_smtp()
+        await (await _get_smtp(gmail_user, gmail_password)).sendmail(gmail_user, recipients, msg)
+
+def _fail_pending(items: list) -> None:
+    for *_, fut in items:
+        if not fut.done():
+            fut.set_exception(RuntimeError("Email service shut down before sending"))
+
+async def _email_worker(queue: asyncio.Queue) -> None:
+    while True:
+        # block for one email, then drain whatever else is already waiting
+        batch = [await queue.get()]
+        while len(batch) < _EMAIL_BATCH_MAX and not queue.empty():
+            batch.append(queue.get_nowait())
+
+        try:
+            for gmail_user, gmail_password, recipients, msg, fut in batch:
+                # caller gave up while queued: don't send something it will never see confirmed
+                if fut.cancelled():
+                    continue
+                try:
+                    await _sendmail(gmail_user, gmail_password, recipients, msg)
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    if not fut.done():
+                        fut.set_result(None)
+        except asyncio.CancelledError:
+            # shutting down mid-batch: the in-flight email and the rest of the batch
+            # must not leave their senders waiting forever
+            _fail_pending(batch)
+            raise
+
+def _email_queue() -> asyncio.Queue:
+    global _EMAIL_QUEUE, _EMAIL_WORKER
+    if _EMAIL_WORKER is None or _EMAIL_WORKER.done():
+        _EMAIL_QUEUE = asyncio.Queue()
+        _EMAIL_WORKER = asyncio.create_task(_email_worker(_EMAIL_QUEUE))
+    return _EMAIL_QUEUE
+
+async def close_email() -> None:
+    """
+    Job shutdown: stop the email worker and QUIT the pooled SMTP connection.
+    """
+    global _EMAIL_WORKER, _EMAIL_QUEUE, _SMTP_CONN
+    if _EMAIL_WORKER is not None:
+        _EMAIL_WORKER.cancel()
+        try:
+            await _EMAIL_WORKER
+        except asyncio.CancelledError:
+            pass
+        # anything still queued will never be picked up
+        if _EMAIL_QUEUE is not None:
+            while not _EMAIL_QUEUE.empty():
+                _fail_pending([_EMAIL_QUEUE.get_nowait()])
+        _EMAIL_WORKER = None
+        _EMAIL_QUEUE = None
+
+    if _SMTP_CONN is not None:
+        try:
+            await _SMTP_CONN.quit()
+        except Exception:
+            _reset_smtp()
+        _SMTP_CONN = None
+
 @function_tool()
 async def send_email(
     context: RunContext,  # type: ignore
@@ -193,6 +480,9 @@ async def send_email(
     message: str,
     cc_email: Optional[str] = None,
 ) -> str:
+    import aiosmtplib
+    from email.message import EmailMessage
+
     try:
         gmail_user = os.getenv("GMAIL_USER")
         gmail_password = os.getenv("GMAIL_APP_PASSWORD")
@@ -200,7 +490,8 @@ async def send_email(
         if not gmail_user or not gmail_password:
             return "Email sending failed: Gmail credentials not configured, Mr. Wayne."
 
-        msg = MIMEMultipart()
+        # single text/plain part: EmailMessage avoids the multipart container
+        msg = EmailMessage()
         msg["From"] = gmail_user
         msg["To"] = to_email
         msg["Subject"] = subject
@@ -210,16 +501,15 @@ async def send_email(
             msg["Cc"] = cc_email.strip()
             recipients.append(cc_email.strip())
 
-        msg.attach(MIMEText(message, "plain"))
+        msg.set_content(message)
 
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(gmail_user, gmail_password)
-        server.sendmail(gmail_user, recipients, msg.as_string())
-        server.quit()
+        # hand off to the background worker and wait for this email's result
+        sent = asyncio.get_running_loop().create_future()
+        _email_queue().put_nowait((gmail_user, gmail_password, recipients, msg.as_bytes(), sent))
+        await sent
 
         return f"Email sent successfully to {to_email}, Mr. Wayne."
-    except smtplib.SMTPAuthenticationError:
+    except aiosmtplib.SMTPAuthenticationError:
         return "Email sending failed: Authentication error. Check your Gmail App Password, Mr. Wayne."
     except Exception as e:
         logging.error(f"Email error: {e}")